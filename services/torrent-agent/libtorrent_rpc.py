@@ -2,7 +2,10 @@
 """Minimal torrent agent for OF-Client - MEMORY OPTIMIZED.
 
 Line-delimited JSON RPC over stdin/stdout.
-Methods: ping, add, pause, resume, remove, status
+Methods: ping, add, pause, resume, remove, status, status_all, subscribe
+
+After "subscribe", status changes and libtorrent errors are pushed as
+{"event": "status" | "alert", ...} lines without an id.
 
 Note: Requires python bindings for libtorrent (rasterbar).
 """
@@ -10,12 +13,17 @@ Note: Requires python bindings for libtorrent (rasterbar).
 import json
 import os
 import platform
+import selectors
 import sys
-import traceback
+import threading
+import time
 
 try:
     import libtorrent as lt
 except Exception as e:
+    # Imported here so normal startups don't pay for traceback/linecache.
+    import traceback
+
     error_detail = traceback.format_exc()
     sys.stdout.write(
         json.dumps(
@@ -47,13 +55,40 @@ def _env_int(name, default, min_val=None, max_val=None):
         return default
 
 
-def _json_dumps(obj):
-    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except Exception:
+    _json_loads = json.loads
+
+    def _json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+_stdout = sys.stdout.buffer
+_stdout_lock = threading.Lock()  # shared by RPC responses and pushed events
+_out_buf = bytearray()  # reused staging buffer for each response line
 
 
 def _write_stdout(obj):
-    sys.stdout.write(_json_dumps(obj) + "\n")
-    sys.stdout.flush()
+    # Callers flush once the pending requests have been answered.
+    with _stdout_lock:
+        _out_buf.clear()
+        _out_buf.extend(_json_dumps(obj))
+        _out_buf.extend(b"\n")
+        _stdout.write(_out_buf)
+
+
+def _flush_stdout():
+    with _stdout_lock:
+        _stdout.flush()
+
+
+def _write_event(obj):
+    _write_stdout(obj)
+    _flush_stdout()
 
 
 def _log(message):
@@ -76,6 +111,86 @@ listen_interfaces = os.environ.get("OF_TORRENT_LISTEN_INTERFACES", "").strip()
 if not listen_interfaces:
     listen_interfaces = "0.0.0.0:%d" % listen_port
 
+# Session settings applied at startup (besides cache_size, file_pool_size and
+# the optional rate limits, which depend on the environment).
+_SESSION_SETTINGS = {
+    # Recursos de rede básicos
+    "enable_dht": True,
+    "enable_lsd": True,
+    "enable_upnp": True,
+    "enable_natpmp": True,
+    "enable_incoming_tcp": True,
+    "enable_outgoing_tcp": True,
+    "enable_incoming_utp": True,
+    "enable_outgoing_utp": True,
+    "prefer_udp_trackers": True,
+    "announce_to_all_trackers": True,
+    "announce_to_all_tiers": True,
+    "use_dht_as_fallback": True,
+
+    # Cache
+    "cache_expiry": 60,
+
+    # I/O — buffers maiores evitam gargalo de disco em downloads rápidos
+    "max_queued_disk_bytes": 32 * 1024 * 1024,   # 32 MB
+    "max_outstanding_disk_bytes": 64 * 1024 * 1024,  # 64 MB
+
+    # Arquivos e conexões (file_pool_size é definido conforme a RAM)
+    "connections_limit": 1000,
+    "max_uploads": -1,          # auto — gerenciado pelo unchoke_slots_limit
+    "max_peerlist_size": 3000,
+    "max_paused_peerlist_size": 200,
+
+    # Velocidade de conexão — quantas novas conexões por segundo
+    # qBittorrent usa valores altos; padrão libtorrent é ~10 (muito lento)
+    "connection_speed": 200,
+    # Extra de conexões logo no início para entrar no swarm rapidamente
+    "torrent_connect_boost": 200,
+
+    # Limites de atividade
+    "active_downloads": 1,
+    "active_seeds": 0,
+    "active_limit": 1,
+
+    # Buffers de envio/recepção — maiores para conexões rápidas
+    "send_buffer_watermark": 8 * 1024 * 1024,       # 8 MB
+    "send_buffer_low_watermark": 512 * 1024,         # 512 KB
+    "send_buffer_watermark_factor": 50,
+    "recv_socket_buffer_size": 1 * 1024 * 1024,     # 1 MB por socket
+    "send_socket_buffer_size": 512 * 1024,           # 512 KB por socket
+
+    # Threads e slots
+    "aio_threads": 4,
+    # 0 = auto (igual ao qBittorrent padrão) — controla quantos peers recebem
+    # upload; mais unchoke slots = melhor tit-for-tat = mais velocidade de download
+    "unchoke_slots_limit": 0,
+    # 1 = rate_based — peers que enviam mais recebem mais (qBittorrent padrão)
+    # Muito mais eficaz que round_robin (0) para maximizar velocidade
+    "choking_algorithm": 1,
+    "mixed_mode_algorithm": 1,
+    "rate_limit_ip_overhead": False,
+
+    # I/O — cache do OS (modo 0) = padrão qBittorrent
+    "disk_io_read_mode": 0,
+    "disk_io_write_mode": 0,
+    # Agrupa escritas/leituras pequenas em operações maiores
+    "coalesce_writes": True,
+    "coalesce_reads": True,
+    # Peers pedem peças vizinhas (extents de 4 MiB) — escritas mais sequenciais no disco
+    "piece_extent_affinity": True,
+
+    # Pipeline de peças — valores maiores melhoram throughput
+    "request_queue_time": 3,
+    "max_out_request_queue": 500,
+    "max_allowed_in_request_queue": 2000,
+
+    # Otimizações adicionais
+    "checking_mem_usage": 256,
+    "suggest_mode": 0,
+    "max_suggest_pieces": 0,
+    "whole_pieces_threshold": 20,
+}
+
 ses = lt.session({"listen_interfaces": listen_interfaces})
 
 def _apply_settings(settings):
@@ -86,120 +201,118 @@ def _apply_settings(settings):
         return False
 
 
+# Older libtorrent builds may expose set_settings instead of apply_settings;
+# resolve it once rather than on every call.
+_set_settings = getattr(ses, "set_settings", None)
+
+
 def _apply_settings_compat(settings):
-    # Older libtorrent builds may expose set_settings instead of apply_settings
+    if not callable(_set_settings):
+        return False
     try:
-        setter = getattr(ses, "set_settings", None)
-        if callable(setter):
-            setter(settings)
-            return True
+        _set_settings(settings)
+        return True
     except Exception:
         return False
-    return False
 
 
 def _apply_settings_safe(settings):
-    # Apply settings one-by-one to avoid a single unsupported key
-    # invalidating the whole batch.
+    # Apply the whole batch in a single call; only fall back to probing
+    # key-by-key when an unsupported key invalidates the batch.
+    if _apply_settings(settings):
+        return
     for key, value in settings.items():
-        applied = False
-        try:
-            applied = _apply_settings({key: value})
-        except Exception:
-            applied = False
-        if not applied:
+        if not _apply_settings({key: value}):
+            _apply_settings_compat({key: value})
+
+
+def _total_ram_gb():
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            class _MemoryStatusEx(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            stat = _MemoryStatusEx()
+            stat.dwLength = ctypes.sizeof(stat)
+            if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(stat)):
+                return None
+            return stat.ullTotalPhys / float(1 << 30)
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / float(1 << 30)
+    except Exception:
+        return None
+
+
+FD_RESERVE = 64  # listen/DHT/tracker sockets, stdio, pipes
+
+
+def _file_pool_fd_budget(wanted_files):
+    # On POSIX the agent inherits the soft RLIMIT_NOFILE (often 1024), which
+    # has to cover peer connections plus the file pool. Try to raise the soft
+    # limit towards the hard one, then return how many descriptors are left
+    # for files (None = no limit to respect).
+    if sys.platform == "win32":
+        return None
+    try:
+        import resource
+    except Exception:
+        return None
+
+    connections = int(_SESSION_SETTINGS.get("connections_limit", 0))
+    needed = connections + wanted_files + FD_RESERVE
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except Exception:
+        return None
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        if target > soft:
             try:
-                _apply_settings_compat({key: value})
+                resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+                soft = target
             except Exception:
+                # e.g. macOS rejects values above OPEN_MAX; keep the old limit.
                 pass
+    if soft == resource.RLIM_INFINITY:
+        return None
+    return soft - connections - FD_RESERVE
+
 
 try:
-    # Cache: 128MB por padrão — reduz gargalo de disco em swarms rápidos sem exagerar no uso de RAM.
+    # Cache: 128MB por padrão. Só vale no libtorrent 1.2 — o 2.x (build padrão)
+    # usa I/O via mmap e ignora cache_size.
     cache_mb = _env_int("OF_TORRENT_CACHE_MB", 128, 16, 512)
     cache_blocks = int(cache_mb * 64)  # blocos de 16 KiB
 
+    # Pool de arquivos proporcional à RAM (16 arquivos abertos por GB, 40-500);
+    # 16 se a RAM for desconhecida.
+    total_ram_gb = _total_ram_gb()
+    if total_ram_gb:
+        default_file_pool = min(500, max(40, int(total_ram_gb * 16)))
+    else:
+        default_file_pool = 16
+    # Não passar do limite de descritores (nunca abaixo dos 16 de antes).
+    fd_budget = _file_pool_fd_budget(default_file_pool)
+    if fd_budget is not None:
+        default_file_pool = max(16, min(default_file_pool, fd_budget))
+    file_pool_size = _env_int("OF_TORRENT_FILE_POOL_SIZE", default_file_pool, 8, 500)
+
     # Always attempt to cap cache size first (even if other keys fail).
     _apply_settings({"cache_size": cache_blocks})
     _apply_settings_compat({"cache_size": cache_blocks})
 
-    _apply_settings_safe(
-        {
-            # Recursos de rede básicos
-            "enable_dht": True,
-            "enable_lsd": True,
-            "enable_upnp": True,
-            "enable_natpmp": True,
-            "enable_incoming_tcp": True,
-            "enable_outgoing_tcp": True,
-            "enable_incoming_utp": True,
-            "enable_outgoing_utp": True,
-            "prefer_udp_trackers": True,
-            "announce_to_all_trackers": True,
-            "announce_to_all_tiers": True,
-            "use_dht_as_fallback": True,
-
-            # Cache
-            "cache_expiry": 60,
-
-            # I/O — buffers maiores evitam gargalo de disco em downloads rápidos
-            "max_queued_disk_bytes": 32 * 1024 * 1024,   # 32 MB
-            "max_outstanding_disk_bytes": 64 * 1024 * 1024,  # 64 MB
-
-            # Arquivos e conexões
-            "file_pool_size": 16,
-            "connections_limit": 1000,
-            "max_uploads": -1,          # auto — gerenciado pelo unchoke_slots_limit
-            "max_peerlist_size": 3000,
-            "max_paused_peerlist_size": 200,
-
-            # Velocidade de conexão — quantas novas conexões por segundo
-            # qBittorrent usa valores altos; padrão libtorrent é ~10 (muito lento)
-            "connection_speed": 200,
-            # Extra de conexões logo no início para entrar no swarm rapidamente
-            "torrent_connect_boost": 200,
-
-            # Limites de atividade
-            "active_downloads": 1,
-            "active_seeds": 0,
-            "active_limit": 1,
-
-            # Buffers de envio/recepção — maiores para conexões rápidas
-            "send_buffer_watermark": 8 * 1024 * 1024,       # 8 MB
-            "send_buffer_low_watermark": 512 * 1024,         # 512 KB
-            "send_buffer_watermark_factor": 50,
-            "recv_socket_buffer_size": 1 * 1024 * 1024,     # 1 MB por socket
-            "send_socket_buffer_size": 512 * 1024,           # 512 KB por socket
-
-            # Threads e slots
-            "aio_threads": 4,
-            # 0 = auto (igual ao qBittorrent padrão) — controla quantos peers recebem
-            # upload; mais unchoke slots = melhor tit-for-tat = mais velocidade de download
-            "unchoke_slots_limit": 0,
-            # 1 = rate_based — peers que enviam mais recebem mais (qBittorrent padrão)
-            # Muito mais eficaz que round_robin (0) para maximizar velocidade
-            "choking_algorithm": 1,
-            "mixed_mode_algorithm": 1,
-            "rate_limit_ip_overhead": False,
-
-            # I/O — cache do OS (modo 0) = padrão qBittorrent
-            "disk_io_read_mode": 0,
-            "disk_io_write_mode": 0,
-            # Agrupa escritas/leituras pequenas em operações maiores
-            "coalesce_writes": True,
-            "coalesce_reads": True,
-
-            # Pipeline de peças — valores maiores melhoram throughput
-            "request_queue_time": 3,
-            "max_out_request_queue": 500,
-            "max_allowed_in_request_queue": 2000,
-
-            # Otimizações adicionais
-            "checking_mem_usage": 256,
-            "suggest_mode": 0,
-            "max_suggest_pieces": 0,
-            "whole_pieces_threshold": 20,
-        }
-    )
+    _apply_settings_safe(dict(_SESSION_SETTINGS, file_pool_size=file_pool_size))
 
     download_limit = _env_int("OF_TORRENT_DOWNLOAD_LIMIT", 0, 0, None)
     upload_limit = _env_int("OF_TORRENT_UPLOAD_LIMIT", 0, 0, None)
@@ -210,10 +323,30 @@ try:
         limits["upload_rate_limit"] = upload_limit
     if limits:
         _apply_settings_safe(limits)
+
+    # The alert loop consumes state_update_alert (status) and error alerts.
+    _apply_settings_safe(
+        {
+            "alert_mask": int(
+                lt.alert.category_t.status_notification | lt.alert.category_t.error_notification
+            )
+        }
+    )
 except Exception:
     pass
 
-handles = {}  # info_hash -> torrent_handle
+handles = {}  # info_hash -> (torrent_handle, info_hash)
+
+# Flags cleared on new torrents so they start downloading right away.
+try:
+    _PAUSED_FLAG = lt.torrent_flags.paused
+except Exception:
+    _PAUSED_FLAG = None
+
+try:
+    _AUTO_MANAGED_FLAG = lt.torrent_flags.auto_managed
+except Exception:
+    _AUTO_MANAGED_FLAG = None
 
 
 def _info_hash_str(h):
@@ -266,24 +399,34 @@ def _params_info_hash(atp):
 def _remember_handle(handle):
     ih = _handle_info_hash(handle)
     if ih:
-        handles[ih] = handle
+        handles[ih] = (handle, ih)
     return ih
 
 
-def _find_handle_by_info_hash(info_hash):
+def _find_entry_by_info_hash(info_hash):
     if not info_hash:
         return None
-    h = handles.get(info_hash)
-    if h is not None:
-        return h
+    entry = handles.get(info_hash)
+    if entry is not None:
+        return entry
+    # Unknown hash: index every torrent in the session in one pass so later
+    # lookups for the others don't rescan.
     try:
         for th in ses.get_torrents():
-            if _handle_info_hash(th) == info_hash:
-                handles[info_hash] = th
-                return th
+            ih = _handle_info_hash(th)
+            if ih and ih not in handles:
+                handles[ih] = (th, ih)
     except Exception:
         pass
-    return None
+    return handles.get(info_hash)
+
+
+def _find_handle_by_info_hash(info_hash):
+    entry = _find_entry_by_info_hash(info_hash)
+    return entry[0] if entry is not None else None
+
+
+created_dirs = set()  # save paths already passed to os.makedirs
 
 
 def _validate_save_path(save_path):
@@ -292,10 +435,14 @@ def _validate_save_path(save_path):
     if os.path.exists(save_path) and not os.path.isdir(save_path):
         raise _rpc_error("Save path is not a directory", "INVALID_SAVE_PATH", path=save_path)
 
-    try:
-        os.makedirs(save_path, exist_ok=True)
-    except Exception as e:
-        raise _rpc_error("Could not create save path: %s" % e, "INVALID_SAVE_PATH", path=save_path)
+    # Torrents are usually added into the same few directories; skip the
+    # makedirs stat walk for those we already created.
+    if save_path not in created_dirs:
+        try:
+            os.makedirs(save_path, exist_ok=True)
+        except Exception as e:
+            raise _rpc_error("Could not create save path: %s" % e, "INVALID_SAVE_PATH", path=save_path)
+        created_dirs.add(save_path)
 
     probe_path = os.path.join(save_path, ".of_torrent_write_test")
     try:
@@ -306,6 +453,10 @@ def _validate_save_path(save_path):
         except Exception:
             pass
     except Exception as e:
+        if save_path in created_dirs and not os.path.isdir(save_path):
+            # Removed since we created it; start over.
+            created_dirs.discard(save_path)
+            return _validate_save_path(save_path)
         raise _rpc_error("Save path is not writable: %s" % e, "SAVE_PATH_NOT_WRITABLE", path=save_path)
 
 
@@ -317,11 +468,34 @@ def _free_bytes(path):
         return None
 
 
-def _ensure_unmanaged(handle):
+def _status_flags():
+    # Only ask for the optional fields status_torrent reports (name and
+    # save_path); progress, rates, peer counts and state are always filled in,
+    # while pieces, distributed copies, etc. are expensive and unused.
     try:
-        handle.unset_flags(lt.torrent_flags.auto_managed)
+        return lt.torrent_handle.query_name | lt.torrent_handle.query_save_path
     except Exception:
-        pass
+        return None
+
+
+_STATUS_FLAGS = _status_flags()
+_STATUS_INT_FIELDS = ("total_wanted", "total_done", "download_rate", "upload_rate", "num_peers", "num_seeds")
+
+
+unmanaged = set()  # info hashes whose auto_managed flag is known to be clear
+
+
+def _ensure_unmanaged(handle, ih=None):
+    # Nothing in the agent sets auto_managed again, so once cleared for a
+    # known info hash the C++ call can be skipped.
+    if _AUTO_MANAGED_FLAG is None or (ih is not None and ih in unmanaged):
+        return
+    try:
+        handle.unset_flags(_AUTO_MANAGED_FLAG)
+    except Exception:
+        return
+    if ih is not None:
+        unmanaged.add(ih)
 
 
 def _tune_handle_for_download(handle):
@@ -436,31 +610,21 @@ def add_torrent(source, save_path, mode=None):
 
     _validate_save_path(save_path)
 
-    # Build add_torrent_params in a way that lets us clear 'paused' / 'auto_managed'.
-    try:
-        paused_flag = lt.torrent_flags.paused
-    except Exception:
-        paused_flag = None
-
-    try:
-        auto_managed_flag = lt.torrent_flags.auto_managed
-    except Exception:
-        auto_managed_flag = None
-
     atp = None
 
-    if isinstance(source, str) and source.lower().endswith(".torrent") and os.path.exists(source):
+    if isinstance(source, str) and source[-8:].lower() == ".torrent" and os.path.exists(source):
         ti = lt.torrent_info(source)
         torrent_info_hash = _info_hash_str(ti.info_hash())
         existing = _find_handle_by_info_hash(torrent_info_hash)
         if existing is not None:
             _apply_update_file_priorities(existing, mode)
-            _ensure_unmanaged(existing)
+            _ensure_unmanaged(existing, torrent_info_hash)
             _tune_handle_for_download(existing)
             try:
                 existing.resume()
             except Exception:
                 pass
+            _forget_status(torrent_info_hash)
             return torrent_info_hash
         try:
             atp = lt.add_torrent_params()
@@ -479,12 +643,13 @@ def add_torrent(source, save_path, mode=None):
         existing = _find_handle_by_info_hash(torrent_info_hash)
         if existing is not None:
             _apply_update_file_priorities(existing, mode)
-            _ensure_unmanaged(existing)
+            _ensure_unmanaged(existing, torrent_info_hash)
             _tune_handle_for_download(existing)
             try:
                 existing.resume()
             except Exception:
                 pass
+            _forget_status(torrent_info_hash)
             return torrent_info_hash
 
         try:
@@ -496,10 +661,10 @@ def add_torrent(source, save_path, mode=None):
     # Clear flags that prevent downloading.
     try:
         if hasattr(atp, "flags"):
-            if auto_managed_flag is not None:
-                atp.flags &= ~auto_managed_flag
-            if paused_flag is not None:
-                atp.flags &= ~paused_flag
+            if _AUTO_MANAGED_FLAG is not None:
+                atp.flags &= ~_AUTO_MANAGED_FLAG
+            if _PAUSED_FLAG is not None:
+                atp.flags &= ~_PAUSED_FLAG
     except Exception:
         pass
 
@@ -511,12 +676,13 @@ def add_torrent(source, save_path, mode=None):
         existing = _find_handle_by_info_hash(torrent_info_hash)
         if existing is not None:
             _apply_update_file_priorities(existing, mode)
-            _ensure_unmanaged(existing)
+            _ensure_unmanaged(existing, torrent_info_hash)
             _tune_handle_for_download(existing)
             try:
                 existing.resume()
             except Exception:
                 pass
+            _forget_status(torrent_info_hash)
             return torrent_info_hash
         raise _rpc_error("Could not add torrent: %s" % e, "ADD_TORRENT_FAILED")
 
@@ -532,35 +698,38 @@ def add_torrent(source, save_path, mode=None):
     ih = _remember_handle(h)
     if not ih:
         raise _rpc_error("Torrent added but info hash is unavailable", "MISSING_INFO_HASH")
+    unmanaged.add(ih)
     return ih
 
 
 def _get_handle(torrent_id):
     if not torrent_id:
         raise _rpc_error("torrentId required", "INVALID_TORRENT_ID")
-    h = _find_handle_by_info_hash(torrent_id)
-    if h is None:
+    entry = _find_entry_by_info_hash(torrent_id)
+    if entry is None:
         raise _rpc_error("torrent not found", "TORRENT_NOT_FOUND", torrentId=torrent_id)
-    return h
+    return entry
 
 
 def pause_torrent(torrent_id):
-    h = _get_handle(torrent_id)
-    _ensure_unmanaged(h)
+    h, ih = _get_handle(torrent_id)
+    _ensure_unmanaged(h, ih)
     h.pause()
+    _forget_status(ih)
     return True
 
 
 def resume_torrent(torrent_id):
-    h = _get_handle(torrent_id)
-    _ensure_unmanaged(h)
+    h, ih = _get_handle(torrent_id)
+    _ensure_unmanaged(h, ih)
     _tune_handle_for_download(h)
     h.resume()
+    _forget_status(ih)
     return True
 
 
 def remove_torrent(torrent_id, delete_files=False):
-    h = _get_handle(torrent_id)
+    h, _ = _get_handle(torrent_id)
     opt = 0
     if delete_files:
         try:
@@ -575,20 +744,27 @@ def remove_torrent(torrent_id, delete_files=False):
         del handles[torrent_id]
     except Exception:
         pass
+    unmanaged.discard(torrent_id)
+    _forget_status(torrent_id)
     return True
 
 
-def status_torrent(torrent_id):
-    h = _get_handle(torrent_id)
-    s = h.status()
+def _torrent_status(h):
+    return h.status() if _STATUS_FLAGS is None else h.status(_STATUS_FLAGS)
 
-    total_wanted = int(getattr(s, "total_wanted", 0) or 0)
-    total_done = int(getattr(s, "total_done", 0) or 0)
-    download_rate = int(getattr(s, "download_rate", 0) or 0)
-    upload_rate = int(getattr(s, "upload_rate", 0) or 0)
 
-    num_peers = int(getattr(s, "num_peers", 0) or 0)
-    num_seeds = int(getattr(s, "num_seeds", 0) or 0)
+def _status_result(h, ih, s):
+    try:
+        total_wanted = int(s.total_wanted)
+        total_done = int(s.total_done)
+        download_rate = int(s.download_rate)
+        upload_rate = int(s.upload_rate)
+        num_peers = int(s.num_peers)
+        num_seeds = int(s.num_seeds)
+    except Exception:
+        total_wanted, total_done, download_rate, upload_rate, num_peers, num_seeds = (
+            int(getattr(s, name, 0) or 0) for name in _STATUS_INT_FIELDS
+        )
 
     progress = 0.0
     try:
@@ -647,12 +823,10 @@ def status_torrent(torrent_id):
     except Exception:
         error_message = ""
 
-    ih = _handle_info_hash(h)
-
     # Stop seeding ASAP once completed.
     if is_finished:
         try:
-            _ensure_unmanaged(h)
+            _ensure_unmanaged(h, ih)
             h.pause()
         except Exception:
             pass
@@ -695,6 +869,142 @@ def status_torrent(torrent_id):
     }
 
 
+def status_torrent(torrent_id):
+    h, ih = _get_handle(torrent_id)
+    return _status_result(h, ih, _torrent_status(h))
+
+
+_STATE_UPDATE_ALERT = getattr(lt, "state_update_alert", None)
+try:
+    _ERROR_CATEGORY = int(lt.alert.category_t.error_notification)
+except Exception:
+    _ERROR_CATEGORY = 0
+
+STATUS_UPDATE_INTERVAL = 1.0  # seconds between post_torrent_updates() calls
+ALERT_WAIT_MS = 250
+
+last_status = {}  # info_hash -> last result built from a state_update_alert
+_status_lock = threading.Lock()
+push_events = False  # set by the "subscribe" method
+
+
+def _forget_status(ih):
+    # Called after the agent changes a torrent itself (pause/resume/re-add/
+    # remove) so status_all queries it directly until the next state update.
+    with _status_lock:
+        last_status.pop(ih, None)
+
+
+def _status_info_hash(s):
+    try:
+        return _info_hash_str(s.info_hash)
+    except Exception:
+        pass
+    try:
+        return _info_hash_str(s.info_hashes.get_best())
+    except Exception:
+        pass
+    return _handle_info_hash(s.handle)
+
+
+def _on_state_update(alert):
+    changed = []
+    for s in alert.status:
+        ih = _status_info_hash(s)
+        entry = handles.get(ih)
+        if entry is None:
+            continue
+        try:
+            res = _status_result(entry[0], ih, s)
+        except Exception as e:
+            _log("[torrent-agent] status failed for %s: %s" % (ih, e))
+            continue
+        with _status_lock:
+            last_status[ih] = res
+        changed.append(res)
+    if changed and push_events:
+        _write_event({"event": "status", "torrents": changed})
+
+
+def _on_error_alert(alert):
+    handle = getattr(alert, "handle", None)
+    _write_event(
+        {
+            "event": "alert",
+            "type": str(alert.what()),
+            "message": str(alert.message()),
+            "infoHash": _handle_info_hash(handle) if handle is not None else None,
+        }
+    )
+
+
+_next_post = 0.0
+
+
+def _pump_alerts(wait_ms):
+    # Sole consumer of ses.pop_alerts(). post_torrent_updates() makes libtorrent
+    # post one state_update_alert with every torrent whose status changed since
+    # the previous post, so idle torrents cost nothing.
+    global _next_post
+    try:
+        now = time.monotonic()
+        if _STATE_UPDATE_ALERT is not None and handles and now >= _next_post:
+            _next_post = now + STATUS_UPDATE_INTERVAL
+            if _STATUS_FLAGS is None:
+                ses.post_torrent_updates()
+            else:
+                ses.post_torrent_updates(_STATUS_FLAGS)
+        if wait_ms:
+            ses.wait_for_alert(wait_ms)
+        alerts = ses.pop_alerts()
+    except Exception as e:
+        _log("[torrent-agent] alert loop error: %s" % e)
+        return False
+
+    for a in alerts:
+        try:
+            if _STATE_UPDATE_ALERT is not None and isinstance(a, _STATE_UPDATE_ALERT):
+                _on_state_update(a)
+            elif push_events and int(a.category()) & _ERROR_CATEGORY:
+                _on_error_alert(a)
+        except Exception as e:
+            _log("[torrent-agent] failed to handle alert: %s" % e)
+    return True
+
+
+def _alert_loop():
+    while True:
+        if not _pump_alerts(ALERT_WAIT_MS):
+            time.sleep(1)
+
+
+def status_all():
+    with _status_lock:
+        for ih in list(last_status):
+            if ih not in handles:
+                del last_status[ih]
+        cached = dict(last_status)
+
+    # Torrents the alert loop hasn't reported yet are queried individually.
+    results = []
+    for ih, (h, _) in list(handles.items()):
+        res = cached.get(ih)
+        if res is None:
+            try:
+                res = _status_result(h, ih, _torrent_status(h))
+            except Exception as e:
+                _log("[torrent-agent] status failed for %s: %s" % (ih, e))
+                continue
+        results.append(res)
+    return {"torrents": results}
+
+
+def subscribe(enabled=True):
+    global push_events
+    push_events = bool(enabled)
+    return {"subscribed": push_events}
+
+
 def ping():
     v = None
     try:
@@ -714,26 +1024,41 @@ def ping():
     }
 
 
+def add_rpc(source, save_path, mode=None):
+    return {"infoHash": add_torrent(source, save_path, mode)}
+
+
+def _torrent_id_args(params):
+    return (params.get("torrentId"),)
+
+
+# method -> (handler, params -> positional args); None means no arguments.
 METHODS = {
-    "ping": lambda params: ping(),
-    "add": lambda params: {"infoHash": add_torrent(params.get("source"), params.get("savePath"), params.get("mode"))},
-    "pause": lambda params: pause_torrent(params.get("torrentId")),
-    "resume": lambda params: resume_torrent(params.get("torrentId")),
-    "remove": lambda params: remove_torrent(params.get("torrentId"), bool(params.get("deleteFiles", False))),
-    "status": lambda params: status_torrent(params.get("torrentId")),
+    "ping": (ping, None),
+    "add": (add_rpc, lambda p: (p.get("source"), p.get("savePath"), p.get("mode"))),
+    "pause": (pause_torrent, _torrent_id_args),
+    "resume": (resume_torrent, _torrent_id_args),
+    "remove": (remove_torrent, lambda p: (p.get("torrentId"), bool(p.get("deleteFiles", False)))),
+    "status": (status_torrent, _torrent_id_args),
+    "status_all": (status_all, None),
+    "subscribe": (subscribe, lambda p: (p.get("enabled", True),)),
 }
 
 
-for line in sys.stdin:
-    line = line.strip()
-    if not line:
-        continue
+MAX_REQUEST_BYTES = 1024 * 1024
+
+
+def _handle_request(line):
+    # Both JSON decoders accept surrounding whitespace, so only blank frames
+    # (e.g. a stray "\r") need to be skipped here.
+    if not line or line.isspace():
+        return None
 
     req = None
     try:
-        if len(line) > 1024 * 1024:
+        if len(line) > MAX_REQUEST_BYTES:
             raise _rpc_error("request too large", "REQUEST_TOO_LARGE")
-        req = json.loads(line)
+        req = _json_loads(line)
         if not isinstance(req, dict):
             raise _rpc_error("request must be a JSON object", "INVALID_REQUEST")
         req_id = req.get("id")
@@ -742,18 +1067,71 @@ for line in sys.stdin:
         if not isinstance(params, dict):
             raise _rpc_error("params must be an object", "INVALID_PARAMS")
 
-        if method not in METHODS:
-            out = {"id": req_id, "error": {"message": "unknown method", "code": "UNKNOWN_METHOD"}}
-        else:
-            res = METHODS[method](params)
-            out = {"id": req_id, "result": res}
+        handler = METHODS.get(method)
+        if handler is None:
+            return {"id": req_id, "error": {"message": "unknown method", "code": "UNKNOWN_METHOD"}}
+        func, argx = handler
+        res = func() if argx is None else func(*argx(params))
+        return {"id": req_id, "result": res}
     except Exception as e:
         code = getattr(e, "rpc_code", "TORRENT_AGENT_ERROR")
         extra = getattr(e, "rpc_extra", {}) or {}
         _log("RPC error [%s]: %s" % (code, str(e)))
-        out = {
+        return {
             "id": (req.get("id") if isinstance(req, dict) else None),
             "error": {"message": str(e), "code": code, **extra},
         }
 
-    _write_stdout(out)
+
+def _handle_frames(frames):
+    for frame in frames:
+        out = _handle_request(frame)
+        if out is not None:
+            _write_stdout(out)
+    _flush_stdout()
+
+
+def _stdin_selector(fd):
+    # select() only works on sockets on Windows, and epoll rejects regular
+    # files; callers fall back to the alert thread when this returns None.
+    if sys.platform == "win32":
+        return None
+    try:
+        sel = selectors.DefaultSelector()
+        sel.register(fd, selectors.EVENT_READ)
+        return sel
+    except Exception:
+        return None
+
+
+def _serve():
+    # Read stdin in large raw chunks and split on newlines ourselves; this
+    # avoids the per-line decode of the text layer and lets a burst of requests
+    # be answered with a single flush. Where stdin can be polled, alerts are
+    # drained between reads instead of on a separate thread.
+    stdin_fd = sys.stdin.buffer.fileno()
+    sel = _stdin_selector(stdin_fd)
+    if sel is None:
+        threading.Thread(target=_alert_loop, name="alert-loop", daemon=True).start()
+
+    buf = bytearray()
+    while True:
+        if sel is not None and not sel.select(ALERT_WAIT_MS / 1000.0):
+            _pump_alerts(0)
+            continue
+        chunk = os.read(stdin_fd, 65536)
+        if not chunk:
+            break
+        buf += chunk
+        if b"\n" in chunk:
+            frames = buf.split(b"\n")
+            buf = frames.pop()
+            _handle_frames(frames)
+        if sel is not None:
+            _pump_alerts(0)
+
+    if buf:
+        _handle_frames([buf])
+
+
+_serve()
@@ -14,7 +14,9 @@ from cx_Freeze import setup, Executable
 # Dependencies are automatically detected, but it might need fine tuning.
 # This is the EXACT same configuration that Hydra Launcher uses.
 build_exe_options = {
-    "packages": ["libtorrent"],
+    "packages": ["libtorrent", "orjson"],
+    # Stdlib modules the agent never imports; keeps the frozen dist smaller.
+    "excludes": ["tkinter", "unittest", "test", "pydoc", "pdb", "setuptools", "pkg_resources"],
     "build_exe": "torrent-agent",
     "include_msvcr": True
 }